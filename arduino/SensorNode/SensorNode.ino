@@ -25,9 +25,14 @@ struct Observation
   time_t stamp;
 };
 
+// Reporting directives, updated from server responses that carry them
+const unsigned long POST_RETRY_MILLIS = 60000;  // Our own retry wait, the server can only lengthen it
+unsigned long postDelayMillis = 0;              // Wait between consecutive posts
+unsigned long postRetryMillis = POST_RETRY_MILLIS;  // Wait before retrying after an error
+
 // Variables
 unsigned long lastTime = 0;       // Holds last time in MS for readings
-unsigned long errorTime = 0;      // Holds last time in MS for re-transmission during an error
+unsigned long errorTime = 0;      // Holds last time in MS of a post, for re-transmission during an error
 int pos = 0;                      // Holds current position
 bool netError = false;            // Used to indicate a network error
 bool dhtError = false;            // Used to indicate a temp error
@@ -177,13 +182,34 @@ void loop()
     takeReading(); 
   }
 
-  // Attempt to post any data in the buffer
+  // Attempt to post any data in the buffer, spaced out as the server asked
   if (!netError)
-    postData();
-  else if (millis() - errorTime > 60000)  // Waits one minute if there was an error before trying again
+  {
+    if (millis() - errorTime >= postDelayMillis)
+      postData();
+  }
+  else if (millis() - errorTime > postRetryMillis)  // Waits as long as the server asked if there was an error before trying again
     postData();
 }
 
+
+void applyDirectives(String response)
+{
+  // Follow the reporting directives in a server response, if it has any
+  StaticJsonDocument<256> doc;
+  if (deserializeJson(doc, response))
+    return;
+
+  JsonObject directives = doc["directives"];
+  if (directives.isNull())
+    return;
+
+  // DataLogger takes one reading per post, so the batch directive does not apply
+  postDelayMillis = (directives["delay"] | 0) * 1000UL;
+  // Never retry sooner than we would on our own
+  postRetryMillis = max(POST_RETRY_MILLIS, (directives["retry"] | 0) * 1000UL);
+}
+
 String createJSON(Observation t) 
 {
   // Will hold the JSON
@@ -289,6 +315,7 @@ void postData()
 
       // Post the data
       int httpResponseCode = http.POST(json);
+      String response = http.getString();
       Serial.print("Posting data to server from buffer position 1 of ");
       Serial.println(pos);
       Serial.println(json);
@@ -296,6 +323,9 @@ void postData()
       
       // Free resources
       http.end();
+
+      // Servers that manage their load send directives with both success and overload (503) replies
+      applyDirectives(response);
           
       // Determine if the data was received
       if (httpResponseCode != 200)
@@ -314,7 +344,9 @@ void postData()
 
         // Record the current time
         // Print an error message to the screen
-        Serial.println("Waiting one minute before trying again.");
+        Serial.print("Waiting ");
+        Serial.print(postRetryMillis / 1000);
+        Serial.println(" seconds before trying again.");
         Serial.println();
       } 
       else
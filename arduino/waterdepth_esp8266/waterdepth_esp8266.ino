@@ -74,7 +74,12 @@ const int TICK_MILLIS = 50;
 const int nData = 60;  // This is the # of samples per POST
 const int BUFFER_SIZE = 30;
 
-const int POST_ERROR_INTERVAL_MILLIS = 30000;
+// Reporting directives, updated from each server response
+const unsigned long POST_RETRY_MILLIS = 30000;  // Our own retry wait, the server can only lengthen it
+const int MAX_POST_BATCH = 5;                   // Most observations packed into one post, bounded by memory for the JSON
+int postBatch = 1;                              // # of buffered observations to send in one post
+unsigned long postDelayMillis = 0;              // Wait between consecutive posts
+unsigned long postRetryMillis = POST_RETRY_MILLIS;  // Wait before retrying a failed post
 const int SAMPLE_INTERVAL_MILLIS = 1000;
 const int DT_MILLIS = TICK_MILLIS;
 
@@ -102,7 +107,9 @@ int buffer_pos = 0;
 
 // Set up the acquistion rate measurement offsets
 unsigned long lastDataMillis = 0; // last time we started acquiring readings
-unsigned long postErrorMillis = -POST_ERROR_INTERVAL_MILLIS;
+unsigned long postErrorMillis = 0;
+unsigned long lastPostMillis = 0;
+bool postError = false;
 
 // Set up 
 int nextDataIntervalMillis = 0;  // Delay in millis to next measurement
@@ -207,34 +214,46 @@ void loop() {
         Serial.println("Time to take data, but buffer full!");
       }
     } 
-    if (millis() - postErrorMillis >= POST_ERROR_INTERVAL_MILLIS && buffer_pos > 0){
+    bool retryReady = !postError || millis() - postErrorMillis >= postRetryMillis;
+    bool delayReady = millis() - lastPostMillis >= postDelayMillis;
+
+    if (retryReady && delayReady && buffer_pos > 0){
       // We have data so post it all back to the server
       while (buffer_pos > 0) {
+        // Send as many observations in one post as the server asked for
+        int n = min(buffer_pos, postBatch);
+
         // Show status
-        Serial.print("Posting data from buffer position: ");
+        Serial.print("Posting data from buffer positions: ");
+        Serial.print(buffer_pos-n);
+        Serial.print(" to ");
         Serial.println(buffer_pos-1);
 
-        // Get the data and pass to subroutine for posting, get status
+        // Pass the data to subroutine for posting, get status
         digitalWrite(LEDPIN, LOW);
         digitalWrite(REDPIN, HIGH);
-        Observation d = buffer_data[buffer_pos-1];
-        bool success = postReading(d);
+        bool success = postReadings(buffer_pos-n, n);
         digitalWrite(LEDPIN, HIGH);
         digitalWrite(REDPIN, LOW);
         
         // If we succeeded, decrement and continue looping.
         if (success) {
-          buffer_pos--;
+          buffer_pos -= n;
+          postError = false;
+          lastPostMillis = millis();
+          // The server asked us to spread our posts out, so come back for the next one later.
+          if (postDelayMillis > 0) {
+            break;
+          }
         } else {
           // We failed, so set an error time entry to wait for the retry.
+          postError = true;
           postErrorMillis = millis();
           break;
         }
       }
       if (buffer_pos == 0) {
-        // We've cleared the buffer, we can make sure we reset our error. 
         Serial.println("No data remains in buffer, finished posting.");
-        postErrorMillis = -POST_ERROR_INTERVAL_MILLIS;
       }
     } else {
     // Don't tick faster than a limit rate when we're not working on anything. 
@@ -243,12 +262,11 @@ void loop() {
   }
 }
 
-void addObservationDict(JsonDocument& docu, Observation obs){
-  // Add the Observation object to the JSON
-  // under the "reading" field. This will
+void addObservationDict(JsonObject reading, Observation& obs){
+  // Fill in a "reading" object of the JSON
+  // from the Observation object. This will
   // look different for different sensors.
 
-  JsonObject reading = docu["reading"].to<JsonObject>();
   reading["timestamp"] = obs.stamp;
   reading["tz"] = baseTZ+DST_offset;
   reading["dt"] = rateInterval/1000.0;
@@ -285,8 +303,8 @@ Observation_pt takeReading(long time_millis)
 
 // ======== Universal Subroutines ========
 
-bool postReading(Observation data){
-  // Post a single observation to the server.
+bool postReadings(int first, int n){
+  // Post n observations from the buffer, starting at first, to the server.
   // This shouldn't need to change from 
   // sensor to sensor, but should be general.
   // Return true on success (http code 200)
@@ -299,18 +317,25 @@ bool postReading(Observation data){
   http.addHeader("Content-Type", "application/json");
 
   // Generate json
-  String json = createJSON(data);
+  String json = createJSON(first, n);
 
   // Post the data
   int httpResponseCode = http.POST(json);
+  String response = http.getString();
 
   // Free resources
   http.end();
 
+  // The server sends directives with both success and overload (503) replies
+  applyDirectives(response);
+
   // Take action based on success/failure
   if (httpResponseCode == 200) {
     Serial.println(json);
     return true;
+  } else if (httpResponseCode == 503) {
+    Serial.println("Server is overloaded, keeping data buffered.");
+    return false;
   } else if (httpResponseCode == 500) {
     Serial.println("Posting failed with Server Error code 500. Possible bad data? Ignoring.");
     return true;
@@ -321,9 +346,34 @@ bool postReading(Observation data){
   }
 }
 
-String createJSON(Observation t) 
+void applyDirectives(String response){
+  // Follow the reporting directives in a server response, if it has any.
+  // This shouldn't need to change from sensor to sensor.
+  // {
+  //  "directives": {
+  //            "batch": <most observations to send in one post>,
+  //            "delay": <seconds between posts>,
+  //            "retry": <seconds before retrying a failed post>
+  //          }
+  // }
+  JsonDocument resp;
+  if (deserializeJson(resp, response)) {
+    return;
+  }
+  JsonObject directives = resp["directives"].as<JsonObject>();
+  if (directives.isNull()) {
+    return;
+  }
+
+  postBatch = constrain(directives["batch"] | 1, 1, MAX_POST_BATCH);
+  postDelayMillis = (directives["delay"] | 0) * 1000UL;
+  // Never retry sooner than we would on our own
+  postRetryMillis = max(POST_RETRY_MILLIS, (directives["retry"] | 0) * 1000UL);
+}
+
+String createJSON(int first, int n) 
 {
-  // Convert an observation to JSON string
+  // Convert n observations from the buffer to a JSON string
   // This should be able to work on any sensor
   // type, and only the subroutines should need
   // to be changed.
@@ -349,6 +399,9 @@ String createJSON(Observation t)
   //             "mac": "00:00:00:00:00:00"
   //          }
   // }
+  //
+  // Several observations are sent as an array
+  // under "readings" in place of "reading".
 
   // A holder to insert the JSON string at the end.
   String output;
@@ -361,7 +414,14 @@ String createJSON(Observation t)
   doc["type"] = DEVTYPE;
 
   // Add the data
-  addObservationDict(doc, t);
+  if (n == 1) {
+    addObservationDict(doc["reading"].to<JsonObject>(), buffer_data[first]);
+  } else {
+    JsonArray readings = doc["readings"].to<JsonArray>();
+    for (int i = first; i < first + n; i++) {
+      addObservationDict(readings.add<JsonObject>(), buffer_data[i]);
+    }
+  }
 
   // Add the net info
   addNetDict(doc);
@@ -0,0 +1,68 @@
+"""
+Compares ingest throughput of the SQLite and MySQL backends of DBManager.
+
+Each backend is timed writing one reading per transaction, as the /sensors/ and /db/insert
+routes do, and writing buffered readings with insert_readings. Both databases are wiped.
+
+Run from the flask-app directory:
+    python -m benchmarks.bench_ingest --path bench.db
+    python -m benchmarks.bench_ingest --host <ip> --user <user> --password <password> --database benchmark
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from db.dbmanager import DBManager
+
+
+def make_readings(n_rows, offset=0):
+    start = datetime(2024, 1, 1) + timedelta(seconds=offset)
+    return [((start + timedelta(seconds=i)).strftime("%Y-%m-%d %H:%M:%S"), {"depth": i * 0.5}) for i in range(n_rows)]
+
+
+def run(label, db, n_rows, batch):
+    db.reinitialize_db()
+    db.init_sensor("bench")
+
+    readings = make_readings(n_rows)
+    t0 = time.perf_counter()
+    for timestamp, data in readings:
+        db.insert_reading("bench", timestamp, data)
+    single = time.perf_counter() - t0
+
+    readings = make_readings(n_rows, offset=n_rows)
+    t0 = time.perf_counter()
+    for first in range(0, n_rows, batch):
+        db.insert_readings("bench", readings[first:first + batch])
+    batched = time.perf_counter() - t0
+
+    print(f"{label:<8} insert_reading  {n_rows / single:10.0f} rows/s")
+    print(f"{label:<8} insert_readings {n_rows / batched:10.0f} rows/s  (batch={batch})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', help="SQLite database file to benchmark")
+    parser.add_argument('--host', help="MySQL server to benchmark")
+    parser.add_argument('--user', default='user')
+    parser.add_argument('--password', default='password')
+    parser.add_argument('--database', default='benchmark')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--batch', type=int, default=500)
+    args = parser.parse_args()
+
+    if args.path is None and args.host is None:
+        parser.error("give --path, --host or both")
+
+    if args.path is not None:
+        db = DBManager(backend='sqlite', path=args.path)
+        run("sqlite", db, args.rows, args.batch)
+        db.close()
+    if args.host is not None:
+        db = DBManager(database=args.database, host=args.host, user=args.user, password=args.password, backend='mysql')
+        run("mysql", db, args.rows, args.batch)
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
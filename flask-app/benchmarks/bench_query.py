@@ -0,0 +1,78 @@
+"""
+Compares the read paths of DBManager on a large synthetic dataset.
+
+Run from the flask-app directory against a scratch database, which will be wiped:
+    python -m benchmarks.bench_query --host <ip> --user <user> --password <password> --database benchmark
+    python -m benchmarks.bench_query --backend sqlite --path bench.db
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from db.dbmanager import DBManager
+
+
+def populate(db, n_rows, n_sensors, batch=10000):
+    """
+    Reinitializes the database and fills it with n_rows readings spread across n_sensors sensors.
+    Each observation carries a single 'depth' value, so the number of observations equals n_rows.
+    """
+    db.reinitialize_db()
+    for i in range(n_sensors):
+        db.init_sensor(f"bench{i}")
+
+    start = datetime(2024, 1, 1)
+    for first in range(0, n_rows, batch):
+        oids = range(first + 1, min(first + batch, n_rows) + 1)
+        db.cursor.executemany('INSERT INTO observations (OID, SID, Timestamp) VALUES (%s, %s, %s)',
+                              [(oid, oid % n_sensors + 1, (start + timedelta(seconds=oid)).strftime("%Y-%m-%d %H:%M:%S")) for oid in oids])
+        db.cursor.executemany('INSERT INTO datavals (OID, Data, Category) VALUES (%s, %s, %s)',
+                              [(oid, oid * 0.5, 'depth') for oid in oids])
+        db.connection.commit()
+
+
+def timed(label, func, *args, **kwargs):
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - t0
+    print(f"{label:<32} {elapsed:8.3f} s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', default='mysql', choices=['mysql', 'sqlite'])
+    parser.add_argument('--path', help="SQLite database file")
+    parser.add_argument('--host', default='ip')
+    parser.add_argument('--user', default='user')
+    parser.add_argument('--password', default='password')
+    parser.add_argument('--database', default='benchmark')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--sensors', type=int, default=10)
+    parser.add_argument('--skip-populate', action='store_true', help="Reuse the data from a previous run")
+    args = parser.parse_args()
+
+    db = DBManager(database=args.database, host=args.host, user=args.user, password=args.password,
+                   backend=args.backend, path=args.path)
+    if not args.skip_populate:
+        timed(f"populate {args.rows} rows", populate, db, args.rows, args.sensors)
+
+    # Single sensor, which is all query_db supports
+    rec = timed("query_db (one sensor)", db.query_db, "bench0", category='depth')
+    arr = timed("query_arrays (one sensor)", db.query_arrays, "bench0", category='depth')
+    assert len(rec) == len(arr['data'])
+
+    # Whole category across all sensors
+    rows = timed("test_query (all sensors)", db.test_query, 'depth')
+    arr = timed("query_arrays (all sensors)", db.query_arrays, category='depth')
+    assert len(rows) == len(arr['data'])
+    try:
+        timed("query_arrow (all sensors)", db.query_arrow, category='depth')
+    except ImportError as e:
+        print(e)
+
+    db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""
+Database backends for DBManager.
+
+Each backend knows how to open a connection and how to express the few pieces of SQL that
+differ between engines. Everything else in DBManager is written once against the cursor
+interface of mysql.connector, with %s placeholders.
+"""
+import os
+import re
+import sqlite3
+from datetime import datetime
+from urllib.parse import quote, urlsplit
+
+try:
+    from config import DB_BACKEND
+except ImportError:
+    DB_BACKEND = 'mysql'
+
+try:
+    from config import SQLITE_PATH
+except ImportError:
+    SQLITE_PATH = None
+
+
+# Range of a MySQL TIMESTAMP, kept a day inside the UTC limits so no session time zone can push a value outside
+TIMESTAMP_MIN = datetime(1970, 1, 2)
+TIMESTAMP_MAX = datetime(2038, 1, 18)
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def parse_timestamp(value, clamp=False):
+    """
+    Parses a timestamp given as a datetime or an ISO 8601 string such as '2024-01-01 12:00:00'.
+    Aware times are converted to the local time zone, as MySQL does with the default SYSTEM time zone.
+
+    Args:
+        value (str or datetime): The timestamp.
+        clamp (bool, optional): Move times outside the TIMESTAMP range to its limits instead of
+            rejecting them, e.g. for the bounds of a query. Defaults to False.
+
+    Raises:
+        ValueError: If the value is not a valid timestamp, or is outside 1970-01-02 to 2038-01-18 unless clamped.
+
+    Returns:
+        datetime: A naive local time.
+    """
+    if isinstance(value, datetime):
+        stamp = value
+    else:
+        try:
+            stamp = datetime.fromisoformat(str(value))
+        except ValueError:
+            raise ValueError(f"Invalid timestamp {value!r}, expected the form YYYY-MM-DD HH:MM:SS.")
+    if stamp.tzinfo is not None:
+        stamp = stamp.astimezone().replace(tzinfo=None)
+    if not TIMESTAMP_MIN <= stamp <= TIMESTAMP_MAX:
+        if not clamp:
+            raise ValueError(f"Timestamp {value!r} is outside the supported range "
+                             f"{TIMESTAMP_MIN:%Y-%m-%d} to {TIMESTAMP_MAX:%Y-%m-%d}.")
+        stamp = min(max(stamp, TIMESTAMP_MIN), TIMESTAMP_MAX)
+    return stamp
+
+
+# Strings that can be written into a query without quoting rules of any engine coming into play
+_INLINE_SAFE = re.compile(r'[\w .:-]*', re.ASCII)
+
+
+def can_inline(value):
+    """
+    Checks whether a value can be inlined into a query for readers that cannot bind parameters.
+    """
+    if isinstance(value, int) and not isinstance(value, bool):
+        return True
+    return isinstance(value, str) and _INLINE_SAFE.fullmatch(value) is not None
+
+
+def inline(value):
+    """
+    Formats a value accepted by can_inline as an SQL literal.
+
+    Raises:
+        ValueError: If the value cannot be inlined safely.
+    """
+    if not can_inline(value):
+        raise ValueError(f"{value!r} cannot be inlined into a query.")
+    if isinstance(value, str):
+        return f"'{value}'"
+    return repr(value)
+
+
+class MySQLBackend():
+    name = 'mysql'
+    primary_key = 'INT AUTO_INCREMENT PRIMARY KEY'
+    json_type = 'JSON'
+    # Statements are interpolated client side, so this only keeps them well under max_allowed_packet
+    max_params = 3000
+    # Multi-row inserts only get verifiable OIDs, see insert_ids
+    consecutive_ids = False
+    # InnoDB indexes foreign keys by itself
+    index_statements = []
+    # Row level locking, so bulk loads can run on several connections
+    single_writer = False
+
+    def __init__(self):
+        # Imported here so that SQLite deployments don't need the MySQL connector installed
+        import mysql.connector
+        self.connector = mysql.connector
+        self.IntegrityError = mysql.connector.errors.IntegrityError
+        self.OperationalError = mysql.connector.errors.OperationalError
+        self.id_step = None
+
+    def connect(self, database, host, user, password, path=None):
+        # The host may carry a port, e.g. 'db:3307' or '[::1]:3307'
+        address = urlsplit(f"//{host}")
+        hostname = address.hostname or host
+        port = address.port or 3306
+        netloc = f"[{hostname}]:{port}" if ':' in hostname else f"{hostname}:{port}"
+        # Identifies the database without the credentials, e.g. for bulk_import checkpoints
+        self.target = f"mysql://{host}/{database}"
+        # Connection URI for readers that open their own connection, such as connectorx
+        self.uri = f"mysql://{quote(user, safe='')}:{quote(password, safe='')}@{netloc}/{database}"
+        return self.connector.connect(
+            user=user,
+            password=password,
+            host=hostname,
+            port=port,
+            # name of the mysql service as set in the docker compose file
+            database=database,
+            auth_plugin='mysql_native_password'
+        )
+
+    def cursor(self, connection):
+        return connection.cursor()
+
+    def insert_ids(self, cursor, sid, n_rows):
+        # LAST_INSERT_ID() reports the first row of a multi-row insert. The rest follow at
+        # auto_increment_increment (not 1 under Galera or multi-primary replication), but that is only
+        # guaranteed while no bulk inserts run concurrently, so check that the rows really are there.
+        first = cursor.lastrowid
+        if self.id_step is None:
+            cursor.execute('SELECT @@auto_increment_increment')
+            self.id_step = cursor.fetchone()[0]
+        last = first + self.id_step * (n_rows - 1)
+        cursor.execute('SELECT COUNT(*), SUM(SID = %s) FROM observations WHERE OID BETWEEN %s AND %s AND MOD(OID - %s, %s) = 0',
+                       (sid, first, last, first, self.id_step))
+        count, ours = cursor.fetchone()
+        if count != n_rows or ours != n_rows:
+            raise RuntimeError(f"Observation IDs {first}..{last} of a multi-row insert are not consecutive.")
+        return range(first, last + 1, self.id_step)
+
+    def timestamp(self, value, clamp=False):
+        # Sent in canonical form, MySQL rejects some ISO 8601 forms that Python accepts
+        return parse_timestamp(value, clamp).strftime(TIMESTAMP_FORMAT)
+
+    def bulk_session(self, cursor):
+        pass
+
+    def defer_checks(self, cursor):
+        cursor.execute('SET foreign_key_checks = 0')
+        cursor.execute('SET unique_checks = 0')
+
+    def epoch_seconds(self, column):
+        return f"TIMESTAMPDIFF(SECOND, '1970-01-01 00:00:00', {column})"
+
+    def needs_init(self, cursor):
+        # The MySQL schema is created explicitly through /db/initialize
+        return False
+
+
+class SQLiteBackend():
+    name = 'sqlite'
+    # An INTEGER PRIMARY KEY aliases the rowid, avoiding the extra bookkeeping of AUTOINCREMENT
+    primary_key = 'INTEGER PRIMARY KEY'
+    json_type = 'TEXT'
+    # SQLITE_MAX_VARIABLE_NUMBER on builds older than 3.32
+    max_params = 999
+    # See insert_ids
+    consecutive_ids = True
+    # SQLite does not index foreign keys, add the indexes InnoDB would create
+    index_statements = [
+        'CREATE INDEX IF NOT EXISTS fk_sid_cal ON calibrations (SID)',
+        'CREATE INDEX IF NOT EXISTS fk_sid_obs ON observations (SID)',
+        'CREATE INDEX IF NOT EXISTS fk_oid ON datavals (OID)',
+        'CREATE INDEX IF NOT EXISTS fk_sid_hb ON heartbeats (SID)',
+    ]
+    IntegrityError = sqlite3.IntegrityError
+    OperationalError = sqlite3.OperationalError
+    # One write transaction at a time per database file
+    single_writer = True
+
+    # Tuned for many small writes from a single box:
+    # WAL lets the dashboard read while readings are written, NORMAL sync is durable across
+    # application crashes in WAL mode and only fsyncs at checkpoints.
+    pragmas = [
+        'PRAGMA journal_mode = WAL',
+        'PRAGMA synchronous = NORMAL',
+        'PRAGMA foreign_keys = ON',
+        'PRAGMA temp_store = MEMORY',
+        'PRAGMA cache_size = -64000',
+        'PRAGMA busy_timeout = 5000',
+    ]
+
+    def connect(self, database, host, user, password, path=None):
+        if path is None:
+            path = SQLITE_PATH if SQLITE_PATH is not None else f"{database}.db"
+        self.target = f"sqlite://{path if path == ':memory:' else os.path.abspath(path)}"
+        self.uri = None if path == ':memory:' else f"sqlite://{os.path.abspath(path)}"
+        # Statements are compiled once and reused from the per-connection cache.
+        # Connections are never used concurrently, but may be closed from another thread (e.g. bulk_import).
+        connection = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES, cached_statements=256,
+                                     check_same_thread=False)
+        for pragma in self.pragmas:
+            connection.execute(pragma)
+        return connection
+
+    def cursor(self, connection):
+        return SQLiteCursor(connection.cursor())
+
+    def insert_ids(self, cursor, sid, n_rows):
+        # last_insert_rowid() reports the last row of a multi-row insert. Writers are serialized and
+        # each new rowid is one past the largest, so the rows of one statement are consecutive.
+        last = cursor.lastrowid
+        return range(last - n_rows + 1, last + 1)
+
+    def timestamp(self, value, clamp=False):
+        # SQLite stores any text, so store the canonical form MySQL would return
+        return parse_timestamp(value, clamp).strftime(TIMESTAMP_FORMAT)
+
+    def bulk_session(self, cursor):
+        # Wait for the server's writes to the same file instead of failing after the usual 5 s
+        cursor.execute('PRAGMA busy_timeout = 60000')
+
+    def defer_checks(self, cursor):
+        cursor.execute('PRAGMA foreign_keys = OFF')
+
+    def epoch_seconds(self, column):
+        return f"CAST(ROUND((julianday({column}) - 2440587.5) * 86400) AS INTEGER)"
+
+    def needs_init(self, cursor):
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = %s", ['sensors'])
+        return cursor.fetchone() is None
+
+
+class SQLiteCursor():
+    """
+    Wraps a sqlite3 cursor so it accepts the %s placeholders used throughout DBManager.
+    """
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=None):
+        self._cursor.execute(query.replace('%s', '?'), params if params is not None else ())
+
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(query.replace('%s', '?'), seq_params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+
+# TIMESTAMP columns are stored as text, convert them back to datetimes to match mysql.connector
+sqlite3.register_converter('TIMESTAMP', lambda b: datetime.fromisoformat(b.decode()))
+
+
+backends = {
+    "mysql": MySQLBackend,
+    "sqlite": SQLiteBackend,
+}
+
+
+def get_backend(name=None):
+    """
+    Creates the backend with the given name, or the one selected by DB_BACKEND in the config.
+
+    Raises:
+        ValueError: If the backend name is unknown.
+    """
+    if name is None:
+        name = DB_BACKEND
+    if name not in backends:
+        raise ValueError(f"Unknown database backend {name}, expected one of {list(backends)}.")
+    return backends[name]()
@@ -0,0 +1,337 @@
+"""
+Offline import of logged readings, e.g. from SD cards or other systems.
+
+Accepted formats:
+    CSV    with a header of sensor,timestamp followed by one column per category. Empty cells are skipped.
+    NDJSON with one object per line in the same form as the /db/insert body:
+           {"sensor": <name>, "timestamp": <value>, "data": {"field1": <value>, ...}}
+
+Run from the flask-app directory:
+    python -m db.bulk_import logs/*.csv --workers 4
+
+Rows that cannot be read are reported with their line number and skipped, or stop the import with --strict.
+
+Progress is saved to <file>.checkpoint after every committed sensor group, so an interrupted
+import can be restarted with the same command and will continue where it stopped. The checkpoint
+is removed once the file is complete.
+
+--workers only helps with MySQL. SQLite allows a single writer, so imports into SQLite always use
+one loading connection, which waits up to a minute for a server writing to the same file.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from db.backends import parse_timestamp
+from db.dbmanager import DBManager
+
+try:
+    from config import SERVER_IP
+except ImportError:
+    SERVER_IP = 'ip'
+
+
+# Number of skipped rows reported individually per file
+MAX_REPORTED = 20
+
+
+def check_record(name, timestamp, data_dict):
+    """
+    Checks one record, returning an error message or None if it can be loaded.
+    """
+    if not isinstance(name, str) or name == '':
+        return "missing sensor name"
+    try:
+        parse_timestamp(timestamp)
+    except ValueError as e:
+        return str(e)
+    if not isinstance(data_dict, dict):
+        return "data is not an object"
+    for cat, val in data_dict.items():
+        if val is not None and (isinstance(val, bool) or not isinstance(val, (int, float)) or not math.isfinite(val)):
+            return f"value {val!r} of {cat} is not a number"
+    return None
+
+
+def read_csv(f):
+    """
+    Yields (line, record, error) for each row of a CSV file, where record is (name, timestamp, data_dict),
+    or None with an error message if the row cannot be loaded.
+    """
+    reader = csv.DictReader(f)
+    for row in reader:
+        if None in row:
+            yield reader.line_num, None, f"{len(row[None])} more cells than the header"
+            continue
+        if None in row.values() or 'sensor' not in row or 'timestamp' not in row:
+            yield reader.line_num, None, "fewer cells than the header, or no sensor/timestamp column"
+            continue
+        name = row.pop('sensor')
+        timestamp = row.pop('timestamp')
+        data_dict = {}
+        error = None
+        for cat, val in row.items():
+            if val == '':
+                continue
+            try:
+                data_dict[cat] = float(val)
+            except ValueError:
+                error = f"value {val!r} of {cat} is not a number"
+                break
+        if error is None:
+            error = check_record(name, timestamp, data_dict)
+        yield reader.line_num, None if error else (name, timestamp, data_dict), error
+
+
+def read_ndjson(f):
+    """
+    Yields (line, record, error) for each line of an NDJSON file, where record is (name, timestamp, data_dict),
+    or None with an error message if the line cannot be loaded.
+    """
+    for line_num, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            rec = json.loads(line)
+            name, timestamp, data_dict = rec['sensor'], rec['timestamp'], rec['data']
+        except (ValueError, KeyError, TypeError) as e:
+            yield line_num, None, f"not a reading ({e!r})"
+            continue
+        error = check_record(name, timestamp, data_dict)
+        yield line_num, None if error else (name, timestamp, data_dict), error
+
+
+readers = {
+    ".csv": read_csv,
+    ".ndjson": read_ndjson,
+    ".jsonl": read_ndjson,
+}
+
+
+class Checkpoint():
+    """
+    Tracks how far an import has got through one file.
+
+    All rows before 'rows' are committed. For the chunk of 'chunk_size' rows starting at 'rows',
+    'sensors' lists the sensors whose readings from that chunk are already committed. 'target'
+    identifies the database the rows went into.
+    """
+
+    def __init__(self, path, target, chunk_size):
+        self.path = path
+        self.lock = threading.Lock()
+        self.target = target
+        self.chunk_size = chunk_size
+        self.rows = 0
+        self.sensors = []
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state['target'] != target:
+                raise ValueError(f"{path} belongs to an import into {state['target']}, not {target}. "
+                                 f"Delete it to import the whole file again.")
+            self.rows = state['rows']
+            self.sensors = state['sensors']
+            # The partly loaded chunk has to be read again with the size it was loaded with
+            if self.sensors:
+                self.chunk_size = state['chunk_size']
+
+    def sensor_done(self, name):
+        with self.lock:
+            self.sensors.append(name)
+            self.save()
+
+    def chunk_done(self, rows, chunk_size):
+        with self.lock:
+            self.rows = rows
+            self.sensors = []
+            self.chunk_size = chunk_size
+            self.save()
+
+    def save(self):
+        # Write then rename, so an interruption never leaves a half written checkpoint
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'target': self.target, 'chunk_size': self.chunk_size, 'rows': self.rows, 'sensors': self.sensors}, f)
+        os.replace(tmp, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Importer():
+
+    def __init__(self, db_args, workers=1, chunk_size=50000, defer_checks=False, strict=False):
+        """
+        Args:
+            db_args (dict): Keyword arguments for DBManager.
+            workers (int, optional): Number of connections loading sensor groups in parallel, always 1 on SQLite.
+                Defaults to 1.
+            chunk_size (int, optional): Number of rows read and checkpointed at a time. Defaults to 50000.
+            defer_checks (bool, optional): Turn off foreign key and unique checks on the loading connections.
+                Sensor IDs are already resolved by the importer, so the checks are redundant. Defaults to False.
+            strict (bool, optional): Stop at the first row that cannot be read instead of skipping it. Defaults to False.
+        """
+        self.db_args = db_args
+        self.chunk_size = chunk_size
+        self.defer_checks = defer_checks
+        self.strict = strict
+
+        self.db = DBManager(**db_args)
+        if self.db.backend.single_writer and workers > 1:
+            print(f"{self.db.backend.name} allows a single writer, loading with 1 worker instead of {workers}")
+            workers = 1
+        self.workers = workers
+        self.sids = {}
+        # The pool and its connections are shared by all files of the import
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.local = threading.local()
+        self.connections = []
+        self.connections_lock = threading.Lock()
+
+    def close(self):
+        self.pool.shutdown()
+        for db in self.connections:
+            db.close()
+        self.db.close()
+
+    def get_sid(self, name):
+        # Each sensor name is only looked up (or created) once per import
+        if name not in self.sids:
+            self.sids[name] = self.db.get_sensor_id(name, create_if_null=True)
+        return self.sids[name]
+
+    def worker_db(self):
+        # One connection per worker thread
+        if not hasattr(self.local, 'db'):
+            db = DBManager(**self.db_args)
+            db.backend.bulk_session(db.cursor)
+            if self.defer_checks:
+                db.backend.defer_checks(db.cursor)
+            self.local.db = db
+            with self.connections_lock:
+                self.connections.append(db)
+        return self.local.db
+
+    def load_group(self, name, readings, checkpoint):
+        db = self.worker_db()
+        try:
+            db.insert_observations(self.sids[name], readings, multirow=True)
+        except RuntimeError:
+            # The OIDs of a multi-row insert could not be verified, load the group row by row instead
+            db.connection.rollback()
+            db.insert_observations(self.sids[name], readings)
+        db.connection.commit()
+        checkpoint.sensor_done(name)
+        return len(readings)
+
+    def import_file(self, path, fmt=None):
+        """
+        Imports one file, resuming from its checkpoint if there is one.
+
+        Raises:
+            ValueError: If the checkpoint belongs to another database, or in strict mode for a row that cannot be read.
+
+        Returns:
+            tuple: The number of rows loaded and the number of rows skipped by this run.
+        """
+        if fmt is None:
+            fmt = os.path.splitext(path)[1].lower()
+        if fmt not in readers:
+            raise ValueError(f"Unknown format {fmt} for {path}, expected one of {list(readers)}.")
+
+        checkpoint = Checkpoint(path + '.checkpoint', self.db.backend.target, self.chunk_size)
+        if checkpoint.rows > 0 or checkpoint.sensors:
+            print(f"{path}: resuming after row {checkpoint.rows}")
+
+        loaded = 0
+        skipped = 0
+        t0 = time.perf_counter()
+        with open(path, newline='') as f:
+            records = islice(readers[fmt](f), checkpoint.rows, None)
+            start = checkpoint.rows
+            chunk_size = checkpoint.chunk_size
+            while True:
+                chunk = list(islice(records, chunk_size))
+                if not chunk:
+                    break
+
+                # Group by sensor, so each group goes in as one transaction on one worker
+                groups = {}
+                for line, record, error in chunk:
+                    if record is None:
+                        if self.strict:
+                            raise ValueError(f"{path}:{line}: {error}")
+                        skipped += 1
+                        if skipped <= MAX_REPORTED:
+                            print(f"{path}:{line}: skipped, {error}")
+                        continue
+                    name, timestamp, data_dict = record
+                    groups.setdefault(name, []).append((timestamp, data_dict))
+                for name in groups:
+                    self.get_sid(name)
+
+                futures = [self.pool.submit(self.load_group, name, readings, checkpoint)
+                           for name, readings in groups.items() if name not in checkpoint.sensors]
+                loaded += sum(future.result() for future in futures)
+
+                start += len(chunk)
+                chunk_size = self.chunk_size
+                checkpoint.chunk_done(start, chunk_size)
+                elapsed = time.perf_counter() - t0
+                print(f"{path}: {start} rows, {loaded / elapsed:.0f} rows/s")
+
+        if skipped:
+            print(f"{path}: skipped {skipped} rows that could not be read")
+        checkpoint.remove()
+        return loaded, skipped
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--format', choices=list(readers), help="Override the format implied by the file extension")
+    parser.add_argument('--workers', type=int, default=1, help="Parallel loading connections, sensors are spread across them (MySQL only)")
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--defer-checks', action='store_true', help="Disable foreign key and unique checks while loading")
+    parser.add_argument('--strict', action='store_true', help="Stop at the first row that cannot be read")
+    parser.add_argument('--backend', choices=['mysql', 'sqlite'])
+    parser.add_argument('--path', help="SQLite database file")
+    parser.add_argument('--host', default=SERVER_IP)
+    parser.add_argument('--user', default='user')
+    parser.add_argument('--password', default='password')
+    parser.add_argument('--database', default='databasedata')
+    args = parser.parse_args()
+
+    db_args = {'database': args.database, 'host': args.host, 'user': args.user, 'password': args.password,
+               'backend': args.backend, 'path': args.path}
+    importer = Importer(db_args, workers=args.workers, chunk_size=args.chunk_size, defer_checks=args.defer_checks,
+                        strict=args.strict)
+
+    total = 0
+    total_skipped = 0
+    t0 = time.perf_counter()
+    try:
+        for path in args.files:
+            loaded, skipped = importer.import_file(path, args.format)
+            total += loaded
+            total_skipped += skipped
+    except ValueError as e:
+        parser.exit(1, f"Import stopped: {e}\n")
+    except importer.db.backend.OperationalError as e:
+        parser.exit(1, f"Import interrupted: {e}\nCommitted rows are kept, run the same command again to resume.\n")
+    finally:
+        importer.close()
+    elapsed = time.perf_counter() - t0
+    print(f"Imported {total} rows in {elapsed:.1f} s ({total / elapsed:.0f} rows/s), skipped {total_skipped}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,21 @@
 from typing import Any
-import mysql.connector
+import numpy as np
 import json
 
+from db.backends import get_backend, can_inline, inline
+from db.monitor import monitor
+
+try:
+    import connectorx
+except ImportError:
+    connectorx = None
+
+# Row layout used to convert fetched chunks of (seconds, value, sid) straight into arrays
+_ROW_DTYPE = np.dtype([('seconds', np.int64), ('data', np.float64), ('sid', np.int64)])
+
 class DBManager:
     def __init__(self, database='databasedata', host="ip", user="user",
-                     password="password"):
+                     password="password", backend=None, path=None):
             """
             Initializes a new instance of the DBManager class.
 
@@ -13,16 +24,17 @@ class DBManager:
                 host (str): The host address of the MySQL server. Default is .
                 user (str): The username for the MySQL server. Default is .
                 password (str): The password for the MySQL server. Default is .
+                backend (str, optional): 'mysql' or 'sqlite'. Defaults to DB_BACKEND from the config, or 'mysql'.
+                path (str, optional): The SQLite database file. Defaults to SQLITE_PATH from the config, or <database>.db.
             """
-            self.connection = mysql.connector.connect(
-                user=user,
-                password=password,
-                host=host,
-                # name of the mysql service as set in the docker compose file
-                database=database,
-                auth_plugin='mysql_native_password'
-            )
-            self.cursor = self.connection.cursor()
+            self.backend = get_backend(backend)
+            self.connection = self.backend.connect(database, host, user, password, path)
+            self.cursor = self.backend.cursor(self.connection)
+
+            # An embedded database starts out empty, so create the schema on first use.
+            # This never drops anything, so concurrent first connections are safe.
+            if self.backend.needs_init(self.cursor):
+                self.create_tables()
 
     def __del__(self):
         """
@@ -41,12 +53,21 @@ class DBManager:
             self.cursor.execute('DROP TABLE IF EXISTS datavals')
             self.cursor.execute('DROP TABLE IF EXISTS calibrations')
             self.cursor.execute('DROP TABLE IF EXISTS observations')
-            self.cursor.execute('DROP TABLE IF EXISTS sensors')
             self.cursor.execute('DROP TABLE IF EXISTS heartbeats')
+            self.cursor.execute('DROP TABLE IF EXISTS sensors')
+            self.connection.commit()
 
+            self.create_tables()
 
-            self.cursor.execute('CREATE TABLE sensors ('
-                                    'SID INT AUTO_INCREMENT PRIMARY KEY, '
+    def create_tables(self):
+            """
+            Creates any of the tables 'sensors', 'calibrations', 'observations', 'datavals' and 'heartbeats'
+            that do not exist yet, leaving existing tables and their data untouched.
+            """
+            pk = self.backend.primary_key
+
+            self.cursor.execute('CREATE TABLE IF NOT EXISTS sensors ('
+                                    f'SID {pk}, '
                                     'Name VARCHAR(24), '
                                     'Location VARCHAR(36), '
                                     'Description VARCHAR(255), '
@@ -55,36 +76,38 @@ class DBManager:
                                     'UNIQUE(Name)'
                                 ')'
                                 )
-            self.cursor.execute('CREATE TABLE calibrations ('
-                                    'CID INT AUTO_INCREMENT PRIMARY KEY, '
+            self.cursor.execute('CREATE TABLE IF NOT EXISTS calibrations ('
+                                    f'CID {pk}, '
                                     'SID INT, '
                                     'Timestamp TIMESTAMP, '
-                                    'Calibration JSON, '
+                                    f'Calibration {self.backend.json_type}, '
                                     'constraint fk_sid_cal foreign key(SID) references sensors(SID)'
                                 ')'
                                 )
-            self.cursor.execute('CREATE TABLE observations ('
-                                    'OID INT AUTO_INCREMENT PRIMARY KEY, '
+            self.cursor.execute('CREATE TABLE IF NOT EXISTS observations ('
+                                    f'OID {pk}, '
                                     'SID INT, '
                                     'Timestamp TIMESTAMP, '
                                     'constraint fk_sid_obs foreign key(SID) references sensors(SID)'
                                 ')'
                                 )
-            self.cursor.execute('CREATE TABLE datavals ('
-                                    'VID INT AUTO_INCREMENT PRIMARY KEY, '
+            self.cursor.execute('CREATE TABLE IF NOT EXISTS datavals ('
+                                    f'VID {pk}, '
                                     'OID INT, '
                                     'Data DOUBLE PRECISION, '
                                     'Category VARCHAR(24), '
                                     'constraint fk_oid foreign key(OID) references observations(OID)'
                                 ')'
                                 )
-            self.cursor.execute('CREATE TABLE heartbeats ('
-                                    'HBID INT AUTO_INCREMENT PRIMARY KEY, '
+            self.cursor.execute('CREATE TABLE IF NOT EXISTS heartbeats ('
+                                    f'HBID {pk}, '
                                     'SID INT, '
                                     'Timestamp TIMESTAMP, '
                                     'constraint fk_sid_hb foreign key(SID) references sensors(SID)'
                                 ')'
                                 )
+            for statement in self.backend.index_statements:
+                self.cursor.execute(statement)
             self.connection.commit()
 
     def close(self):
@@ -137,6 +160,129 @@ class DBManager:
             rec.append(str(c[0]))
         return rec
     
+    def query_arrays(self, name=None, start_timestamp=None, end_timestamp=None, category=None, chunk_size=100000):
+        """
+        Query the database for data as typed NumPy arrays using a single joined query.
+
+        If connectorx is installed the result is read column-wise into Arrow buffers without creating
+        a Python object per row. connectorx cannot bind parameters, so a category containing anything but
+        letters, digits, spaces and _.:- is read through the cursor instead. Otherwise rows are fetched through the cursor in chunks of chunk_size,
+        which costs about as much as test_query (1M rows on SQLite: ~1.8 s against ~0.5 s with connectorx).
+        Timestamps are never materialized as datetime objects. Readings with a NULL value are skipped.
+
+        Args:
+            name (str, optional): The name of the sensor. Defaults to None, which returns all sensors.
+            start_timestamp (str, optional): The start timestamp for filtering the data. Defaults to None.
+            end_timestamp (str, optional): The end timestamp for filtering the data. Defaults to None.
+            category (str, optional): The category for filtering the data. Defaults to None.
+            chunk_size (int, optional): The number of rows to fetch per round trip without connectorx. Defaults to 100000.
+
+        Returns:
+            dict: A dictionary of arrays with the keys
+                'timestamp' (datetime64[s]), 'data' (float64), 'sensor' (int32 codes into 'sensor_names')
+                and 'sensor_names' (the sensor name for each code).
+
+        Raises:
+            ValueError: If a timestamp is invalid.
+        """
+        # Seconds since the epoch as stored (in the session time zone for MySQL), so the result
+        # matches the naive timestamps returned by the other queries.
+        query = (f"SELECT {self.backend.epoch_seconds('o.Timestamp')} AS Seconds, d.Data, o.SID "
+                 'FROM datavals d '
+                 'JOIN observations o ON d.OID = o.OID '
+                 'WHERE d.Data IS NOT NULL')
+        params = []
+        if name is not None:
+            # Resolved here with a bound query, so only an integer SID ever reaches the query text
+            sid = self.get_sensor_id(name, create_if_null=False)
+            query += ' AND o.SID = %s'
+            params.append(sid if sid is not None else -1)
+        if start_timestamp is not None and end_timestamp is not None:
+            query += ' AND o.Timestamp BETWEEN %s AND %s'
+            params.extend([self.backend.timestamp(start_timestamp, clamp=True), self.backend.timestamp(end_timestamp, clamp=True)])
+        if category is not None:
+            query += ' AND d.Category = %s'
+            params.append(category)
+
+        if connectorx is not None and self.backend.uri is not None and all(map(can_inline, params)):
+            seconds, data, sid = self._read_columns(query, params)
+        else:
+            seconds, data, sid = self._fetch_columns(query, params, chunk_size)
+
+        # Map SIDs onto compact codes into the list of sensor names that actually appear
+        sids, codes = np.unique(sid, return_inverse=True)
+        names = dict(self._get_sensor_names())
+        sensor_names = np.array([names[i] for i in sids.tolist()], dtype=object)
+
+        return {'timestamp': seconds.astype('datetime64[s]'),
+                'data': data,
+                'sensor': codes.astype(np.int32).ravel(),
+                'sensor_names': sensor_names}
+
+    def _read_columns(self, query, params):
+        """
+        Reads the (seconds, data, sid) columns of a query with connectorx.
+        connectorx opens its own connection and cannot bind parameters, so they are inlined.
+        Callers only pass values accepted by can_inline.
+        """
+        query = query % tuple(inline(p) for p in params)
+        table = connectorx.read_sql(self.backend.uri, query, return_type='arrow')
+        # An empty result carries no column types, so cast explicitly
+        return (np.asarray(table.column(0).to_numpy(), dtype=np.int64),
+                np.asarray(table.column(1).to_numpy(), dtype=np.float64),
+                np.asarray(table.column(2).to_numpy(), dtype=np.int64))
+
+    def _fetch_columns(self, query, params, chunk_size):
+        """
+        Reads the (seconds, data, sid) columns of a query through the DB-API cursor in chunks.
+        """
+        self.cursor.execute(query, params)
+        chunks = []
+        while True:
+            rows = self.cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunks.append(np.array(rows, dtype=_ROW_DTYPE))
+
+        if chunks:
+            table = np.concatenate(chunks)
+        else:
+            table = np.empty(0, dtype=_ROW_DTYPE)
+        return table['seconds'], table['data'], table['sid']
+
+    def query_arrow(self, name=None, start_timestamp=None, end_timestamp=None, category=None, chunk_size=100000):
+        """
+        Query the database for data as an Arrow table. Requires pyarrow.
+
+        Args:
+            name (str, optional): The name of the sensor. Defaults to None, which returns all sensors.
+            start_timestamp (str, optional): The start timestamp for filtering the data. Defaults to None.
+            end_timestamp (str, optional): The end timestamp for filtering the data. Defaults to None.
+            category (str, optional): The category for filtering the data. Defaults to None.
+            chunk_size (int, optional): The number of rows to fetch per round trip. Defaults to 100000.
+
+        Returns:
+            pyarrow.Table: A table with the columns 'timestamp', 'data' and a dictionary encoded 'sensor'.
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("query_arrow requires pyarrow, install it with 'pip install pyarrow'.")
+
+        arrays = self.query_arrays(name, start_timestamp, end_timestamp, category, chunk_size)
+        sensor = pa.DictionaryArray.from_arrays(pa.array(arrays['sensor'], type=pa.int32()),
+                                                pa.array(arrays['sensor_names'].tolist(), type=pa.string()))
+        return pa.table({'timestamp': pa.array(arrays['timestamp'], type=pa.timestamp('s')),
+                         'data': pa.array(arrays['data'], type=pa.float64()),
+                         'sensor': sensor})
+
+    def _get_sensor_names(self):
+        """
+        Retrieves the (SID, Name) pairs for all sensors in the database.
+        """
+        self.cursor.execute('SELECT SID, Name FROM sensors')
+        return self.cursor.fetchall()
+
     def get_sensor_list(self):
             """
             Retrieves a list of all sensors in the database.
@@ -221,7 +367,7 @@ class DBManager:
                 mysid = self.cursor.lastrowid
                 self.connection.commit()
                 self.set_calibration(mysid, '2024-01-01 12:00:00', '{}')
-            except mysql.connector.errors.IntegrityError:
+            except self.backend.IntegrityError:
                 print(f"Sensor {name} already exists, skipping...")
                 mysid = self.get_sensor_id(name, create_if_null=False)
             return mysid
@@ -236,11 +382,12 @@ class DBManager:
             - cal (dict): The calibration data.
 
             Raises:
-            - ValueError: If the sensor does not exist.
+            - ValueError: If the sensor does not exist or the timestamp is invalid.
 
             Returns:
             None
             """
+            timestamp = self.backend.timestamp(timestamp)
             self.cursor.execute('SELECT * FROM calibrations where SID = %s', [sid])
             sens = self.cursor.fetchall()
             if len(sens) > 0:
@@ -257,7 +404,7 @@ class DBManager:
                 # It doesn't exist, so initialize it
                 try:
                     self.cursor.execute('INSERT INTO calibrations (SID, Timestamp, Calibration) VALUES (%s, %s, %s);', (sid, timestamp, json.dumps(cal)))
-                except mysql.connector.errors.IntegrityError:
+                except self.backend.IntegrityError:
                     raise ValueError(f"Sensor {sid} does not exist, cannot set calibration.")
             self.connection.commit()
 
@@ -302,16 +449,70 @@ class DBManager:
             Returns:
                 None
             """
-            
-            mysid = self.get_sensor_id(name, netdata, create_if_null=True)
-                            
-            self.cursor.execute('INSERT INTO observations (SID, Timestamp) VALUES (%s, %s);', (mysid, timestamp))
-            myoid = self.cursor.lastrowid
-
-            # obs['data'] is a dictionary of {category: value}
-            for cat, val in data_dict.items():
-                self.cursor.execute('INSERT INTO datavals (OID, Data, Category) VALUES (%s, %s, %s);', (myoid, val, cat))
-            self.connection.commit()
+            self.insert_readings(name, [(timestamp, data_dict)], netdata)
+
+    def insert_readings(self, name, readings, netdata=None):
+            """
+            Inserts several readings from one sensor into the database in a single transaction.
+
+            Args:
+                name (str): The name of the sensor.
+                readings (list): A list of (timestamp, data_dict) tuples, as passed to insert_reading.
+                netdata (dict): A dictionary containing the network data for the sensor. Defaults to None.
+
+            Returns:
+                None
+            """
+            # Live ingest (/sensors/ and /db/insert) goes through here, so it is what the load monitor times
+            with monitor.track():
+                mysid = self.get_sensor_id(name, netdata, create_if_null=True)
+                self.insert_observations(mysid, readings)
+                self.connection.commit()
+
+    def insert_observations(self, sid, readings, multirow=False):
+            """
+            Inserts readings for a known sensor ID, without committing.
+
+            The values are always written with multi-row statements. Observations are too when the backend
+            guarantees their OIDs (SQLite), or when multirow is set and the OIDs can be verified after each statement.
+
+            Args:
+                sid (int): The sensor ID.
+                readings (list): A list of (timestamp, data_dict) tuples, as passed to insert_reading.
+                multirow (bool, optional): Use multi-row observation inserts on MySQL too. Defaults to False.
+
+            Raises:
+                ValueError: If any timestamp is invalid, before anything is written.
+                RuntimeError: If multirow is set and the OIDs of a statement could not be verified.
+                    The transaction must then be rolled back.
+
+            Returns:
+                None
+            """
+            readings = [(self.backend.timestamp(timestamp), data_dict) for timestamp, data_dict in readings]
+
+            if multirow or self.backend.consecutive_ids:
+                oids = []
+                # Each statement is kept under the placeholder limit of the backend
+                step = self.backend.max_params // 2
+                for first in range(0, len(readings), step):
+                    batch = readings[first:first + step]
+                    self.cursor.execute('INSERT INTO observations (SID, Timestamp) VALUES ' + ', '.join(['(%s, %s)'] * len(batch)) + ';',
+                                        [v for timestamp, _ in batch for v in (sid, timestamp)])
+                    oids.extend(self.backend.insert_ids(self.cursor, sid, len(batch)))
+            else:
+                oids = []
+                for timestamp, _ in readings:
+                    self.cursor.execute('INSERT INTO observations (SID, Timestamp) VALUES (%s, %s);', (sid, timestamp))
+                    oids.append(self.cursor.lastrowid)
+
+            # data_dict is a dictionary of {category: value}
+            vals = [(oid, val, cat) for oid, (_, data_dict) in zip(oids, readings) for cat, val in data_dict.items()]
+            step = self.backend.max_params // 3
+            for first in range(0, len(vals), step):
+                batch = vals[first:first + step]
+                self.cursor.execute('INSERT INTO datavals (OID, Data, Category) VALUES ' + ', '.join(['(%s, %s, %s)'] * len(batch)) + ';',
+                                    [x for row in batch for x in row])
 
     def update_heartbeat(self, name, timestamp):
             """
@@ -325,19 +526,21 @@ class DBManager:
             Returns:
                 None
             """
-            mysid = self.get_sensor_id(name, create_if_null=True)
-            # Update the value of the heartbeat with the latest timestamp
-            self.cursor.execute('SELECT * FROM heartbeats where SID = %s', [mysid])
-            sens = self.cursor.fetchall()
-            if len(sens) > 0:
-                # It exists, so update the timestamp
-                self.cursor.execute('UPDATE heartbeats SET Timestamp = %s WHERE SID = %s;', (timestamp, mysid))
-            else:
-                # It doesn't exist, so initialize it
-                self.cursor.execute('INSERT INTO heartbeats (SID, Timestamp) VALUES (%s, %s);', (mysid, timestamp))
-            
-            self.connection.commit()
-    
+            timestamp = self.backend.timestamp(timestamp)
+            with monitor.track():
+                mysid = self.get_sensor_id(name, create_if_null=True)
+                # Update the value of the heartbeat with the latest timestamp
+                self.cursor.execute('SELECT * FROM heartbeats where SID = %s', [mysid])
+                sens = self.cursor.fetchall()
+                if len(sens) > 0:
+                    # It exists, so update the timestamp
+                    self.cursor.execute('UPDATE heartbeats SET Timestamp = %s WHERE SID = %s;', (timestamp, mysid))
+                else:
+                    # It doesn't exist, so initialize it
+                    self.cursor.execute('INSERT INTO heartbeats (SID, Timestamp) VALUES (%s, %s);', (mysid, timestamp))
+
+                self.connection.commit()
+
     def read_heartbeat(self, name=None):
             """
             Reads all the heartbeat for a single sensor.
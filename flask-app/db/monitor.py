@@ -0,0 +1,52 @@
+from contextlib import contextmanager
+import threading
+import time
+
+# Ingest is considered at capacity (load 1.0) at either of these
+MAX_INFLIGHT = 8            # Database writes of readings in progress at once
+TARGET_LATENCY_S = 0.5      # Smoothed time of one write
+LATENCY_HALF_LIFE_S = 30    # Decay of the latency while idle, so shedding ends once posts stop coming in
+
+
+class IngestMonitor():
+    """
+    Tracks the number of ingest writes in progress and a moving average of how long they take.
+    Only database work is timed, so slow notifications do not count as load. Counts are per server process.
+    """
+
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.latency = 0.0
+        self.updated = time.monotonic()
+
+    @contextmanager
+    def track(self):
+        with self.lock:
+            self.inflight += 1
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            with self.lock:
+                self.inflight -= 1
+                self.latency = self._decayed_latency()
+                self.latency += self.alpha * (elapsed - self.latency)
+                self.updated = time.monotonic()
+
+    def _decayed_latency(self):
+        return self.latency * 0.5 ** ((time.monotonic() - self.updated) / LATENCY_HALF_LIFE_S)
+
+    def load(self):
+        with self.lock:
+            return max(self.inflight / MAX_INFLIGHT, self._decayed_latency() / TARGET_LATENCY_S)
+
+    def inflight_load(self):
+        # Only counts writes in progress now, so a single slow write in the past does not raise it
+        with self.lock:
+            return self.inflight / MAX_INFLIGHT
+
+
+monitor = IngestMonitor()
@@ -0,0 +1,57 @@
+from db.monitor import monitor
+from sensors.models.notifications import PRIORITY
+
+# Directive scaling
+MAX_BACKOFF = 16            # Largest multiplier applied to the base values
+MAX_BATCH = 16              # Most readings asked for in one post
+BASE_RETRY_S = 30           # Retry interval of an unloaded server, nodes keep their own if it is longer
+DELAY_STEP_S = 5            # Added between posts for each step of backoff
+
+# Higher priority nodes see a fraction of the real load, so they are slowed and shed last
+priority_weights = {
+    PRIORITY.urgent: 0.25,
+    PRIORITY.high: 0.5,
+    PRIORITY.default: 1.0,
+    PRIORITY.low: 1.5,
+    PRIORITY.min: 2.0,
+}
+
+# Water alarms and heartbeats are only slowed down by slow writes, and refused only
+# while writes in progress pile up past their share of capacity
+inflight_only = {PRIORITY.urgent, PRIORITY.high}
+
+
+def get_directives(priority, load=None, inflight_load=None):
+    """
+    Computes the reporting directives for a node of the given priority.
+
+    Args:
+        priority (PRIORITY): The priority class of the node.
+        load (float, optional): The current ingest load, 1.0 being at capacity. Defaults to the monitor's value.
+        inflight_load (float, optional): The part of the load due to writes in progress now.
+            Defaults to the monitor's value.
+
+    Returns:
+        tuple: (directives, shed), where directives is a dictionary of
+               'batch' (most buffered readings to send in one post), 'delay' (seconds between posts)
+               and 'retry' (seconds before retrying a failed post), and shed is True if this post
+               should be refused.
+    """
+    if load is None:
+        load = monitor.load()
+    if inflight_load is None:
+        inflight_load = monitor.inflight_load()
+    effective = load * priority_weights[priority]
+
+    # Back off once past half capacity, doubling with the load
+    factor = min(MAX_BACKOFF, max(1.0, 2 * effective))
+    directives = {
+        'batch': min(MAX_BATCH, int(round(factor))),
+        'delay': int(round(DELAY_STEP_S * (factor - 1))),
+        'retry': int(round(BASE_RETRY_S * factor)),
+    }
+    if priority in inflight_only:
+        shed = inflight_load * priority_weights[priority] >= 1.0
+    else:
+        shed = effective >= 1.0
+    return directives, shed
@@ -1,6 +1,9 @@
 from db.dbmanager import DBManager
+from sensors.models.notifications import PRIORITY
 
 class Sensor():
+    # Priority class when the server is shedding load
+    priority = PRIORITY.default
     
     def __init__(self, postjson):
         self.postjson = postjson
@@ -14,8 +17,16 @@ class Sensor():
     def process(self):
         self.name = self.postjson['name']
         self.type = self.postjson['type']
-        self.timestamp = self.postjson['reading']['timestamp']
-        self.data = self.postjson['reading']['data']
+        # A post carries either one "reading" or a batch of "readings"
+        if 'readings' in self.postjson:
+            readings = self.postjson['readings']
+        else:
+            readings = [self.postjson['reading']]
+        self.readings = [(r['timestamp'], r['data']) for r in readings]
+        if len(self.readings) == 0:
+            raise ValueError("A post needs at least one reading.")
+        # The latest reading
+        self.timestamp, self.data = self.readings[-1]
         try:
             self.netdata = self.postjson['netdata']
         except KeyError:
@@ -29,5 +40,5 @@ class Sensor():
 
     def post(self):
         db = DBManager()
-        db.insert_reading(self.name, self.timestamp, self.data, self.netdata)
+        db.insert_readings(self.name, self.readings, self.netdata)
         db.close()
\ No newline at end of file
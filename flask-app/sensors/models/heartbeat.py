@@ -9,6 +9,7 @@ from config import HEARTBEAT_INTERVAL_MINS
 
 class HeartbeatSensor(Sensor):
     calibration = None
+    priority = PRIORITY.high
 
     def __init__(self, postjson):
         super().__init__(postjson)
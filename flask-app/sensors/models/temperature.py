@@ -12,6 +12,7 @@ class TemperatureHumiditySensor(Sensor):
         super().process()
 
         # Test notification, send the latest value at 6PM each day.
-        if " 18:00" in self.timestamp:
-            notify("Temperature Reading", f"At {self.timestamp} from {self.name}: \nTemperature: {self.data['temperature']}\nHumidity: {self.data['humidity']}!", PRIORITY.low)
+        for timestamp, data in self.readings:
+            if " 18:00" in timestamp:
+                notify("Temperature Reading", f"At {timestamp} from {self.name}: \nTemperature: {data['temperature']}\nHumidity: {data['humidity']}!", PRIORITY.low)
     
@@ -7,6 +7,7 @@ from db.dbmanager import DBManager
 
 class WaterSensor(Sensor):
     calibration = None
+    priority = PRIORITY.high
 
     def __init__(self, data):
         super().__init__(data)
@@ -22,13 +23,18 @@ class WaterSensor(Sensor):
         # print(self.data)
 
     def post(self):
+        readings = []
+        for start, data in self.readings:
+            for d, m in zip(data["depth"], data["millis"]):
+                data_i = {
+                    "depth": d,
+                }
+
+                # Adding 500 ms, and replacing us with 0 rounds to nearest second
+                timestamp = (datetime.strptime(start, "%Y-%m-%d %H:%M:%S") + timedelta(milliseconds=m+500)).replace(microsecond=0).strftime("%Y-%m-%d %H:%M:%S")
+                readings.append((timestamp, data_i))
+
+        # Write everything in the post in one transaction
         db = DBManager()
-        for d, m in zip(self.data["depth"],self.data["millis"]):
-            data_i = {
-                "depth": d,
-            }
-            
-            # Adding 500 ms, and replacing us with 0 rounds to nearest second
-            timestamp = (datetime.strptime(self.timestamp, "%Y-%m-%d %H:%M:%S") + timedelta(milliseconds=m+500)).replace(microsecond=0).strftime("%Y-%m-%d %H:%M:%S")
-            db.insert_reading(self.name, timestamp, data_i, self.netdata)
+        db.insert_readings(self.name, readings, self.netdata)
         db.close()
\ No newline at end of file
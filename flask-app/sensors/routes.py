@@ -4,6 +4,7 @@ from sensors.models.abstractsensor import Sensor
 from sensors.models.water import WaterSensor
 from sensors.models.heartbeat import HeartbeatSensor
 from sensors.models.temperature import TemperatureHumiditySensor as ths
+from sensors.load import get_directives
 
 bp = Blueprint('sensors', __name__)
 
@@ -27,6 +28,22 @@ managermap = {
 #                "mac": <value>
 #              }
 # }
+# Several buffered readings may be sent at once as "readings": [<reading>, <reading>, ...]
+# in place of "reading", up to the batch size in the directives.
+
+# Server Responses are:
+# { "time": <timestamp>,
+#   "type": <type>,
+#   "name": <name>,
+#   "directives": {
+#                   "batch": <most readings to send in one post>,
+#                   "delay": <seconds between posts>,
+#                   "retry": <seconds before retrying a failed post>
+#                 }
+# }
+# "time" is the timestamp of the last reading in the post.
+# When overloaded, lower priority posts are refused with a 503 and a Retry-After header.
+# Water and heartbeat posts are only refused while writes in progress pile up.
 
 
 @bp.route('/', methods=['POST'])
@@ -38,10 +55,27 @@ def index():
     else:
         sensortype = "default"
     
+    readings = postjson['readings'] if 'readings' in postjson else [postjson.get('reading')]
+    if (not isinstance(readings, list) or len(readings) == 0
+            or not all(isinstance(r, dict) and 'timestamp' in r and 'data' in r for r in readings)):
+        return jsonify({'error': 'Expected a "reading" or a non-empty list of "readings", each with a timestamp and data'}), 400
+
+    directives, shed = get_directives(managermap[sensortype].priority)
+    reply = {'time': f"{readings[-1]['timestamp']}",
+             'type': f"{postjson['type']}",
+             'name': f"{postjson['name']}",
+             'directives': directives}
+
+    if shed:
+        # The node keeps the reading buffered and tries again later
+        return jsonify(reply), 503, {'Retry-After': str(directives['retry'])}
+
     sensor = managermap[sensortype](postjson)
-    sensor.process()
-    sensor.post()
+    try:
+        sensor.process()
+        sensor.post()
+    except ValueError as e:
+        # e.g. an invalid timestamp, nothing of the post is written
+        return jsonify({'error': str(e)}), 400
 
-    return jsonify({'time': f"{postjson['reading']['timestamp']}",
-                    'type': f"{postjson['type']}",
-                    'name': f"{postjson['name']}"}), 200
+    return jsonify(reply), 200
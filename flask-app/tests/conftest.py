@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+from db.dbmanager import DBManager
+
+# The MySQL runs need a scratch database, which is wiped by every test:
+#   SENSOR_TEST_MYSQL_HOST, SENSOR_TEST_MYSQL_USER, SENSOR_TEST_MYSQL_PASSWORD, SENSOR_TEST_MYSQL_DATABASE
+MYSQL_HOST = os.environ.get('SENSOR_TEST_MYSQL_HOST')
+
+
+def make_db(backend, tmp_path):
+    if backend == 'sqlite':
+        return DBManager(backend='sqlite', path=str(tmp_path / 'test.db'))
+
+    if MYSQL_HOST is None:
+        pytest.skip("no MySQL server configured, set SENSOR_TEST_MYSQL_HOST")
+    pytest.importorskip('mysql.connector')
+    db = DBManager(database=os.environ.get('SENSOR_TEST_MYSQL_DATABASE', 'test'),
+                   host=MYSQL_HOST,
+                   user=os.environ.get('SENSOR_TEST_MYSQL_USER', 'user'),
+                   password=os.environ.get('SENSOR_TEST_MYSQL_PASSWORD', 'password'),
+                   backend='mysql')
+    db.reinitialize_db()
+    return db
+
+
+@pytest.fixture(params=['sqlite', 'mysql'])
+def db(request, tmp_path):
+    db = make_db(request.param, tmp_path)
+    yield db
+    db.close()
@@ -0,0 +1,153 @@
+import json
+import os
+
+import pytest
+
+from db import bulk_import
+from db.bulk_import import Importer
+from db.dbmanager import DBManager
+
+
+class Interrupted(Exception):
+    pass
+
+
+def write_csv(path, n_rows, n_sensors=3, extra=()):
+    with open(path, 'w') as f:
+        f.write('sensor,timestamp,depth,temperature\n')
+        for i in range(n_rows):
+            f.write(f's{i % n_sensors},2024-01-01 {i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d},{i},{-i}\n')
+        for line in extra:
+            f.write(line + '\n')
+
+
+def counts(db_path):
+    db = DBManager(backend='sqlite', path=db_path)
+    db.cursor.execute('SELECT s.Name, COUNT(*), SUM(d.Data) FROM datavals d JOIN observations o ON d.OID = o.OID '
+                      'JOIN sensors s ON o.SID = s.SID WHERE d.Category = %s GROUP BY s.Name ORDER BY s.Name', ['depth'])
+    rows = db.cursor.fetchall()
+    db.close()
+    return rows
+
+
+@pytest.fixture
+def db_args(tmp_path):
+    return {'backend': 'sqlite', 'path': str(tmp_path / 'test.db')}
+
+
+def test_import_csv_and_ndjson(tmp_path, db_args):
+    csv_path = str(tmp_path / 'a.csv')
+    write_csv(csv_path, 100)
+    ndjson_path = str(tmp_path / 'b.ndjson')
+    with open(ndjson_path, 'w') as f:
+        for i in range(10):
+            f.write(json.dumps({'sensor': 's9', 'timestamp': '2024-02-01 00:00:00', 'data': {'depth': i}}) + '\n')
+
+    importer = Importer(db_args, chunk_size=30, workers=2)
+    assert importer.import_file(csv_path) == (100, 0)
+    assert importer.import_file(ndjson_path) == (10, 0)
+    importer.close()
+
+    assert counts(db_args['path']) == [('s0', 34, sum(range(0, 100, 3))),
+                                       ('s1', 33, sum(range(1, 100, 3))),
+                                       ('s2', 33, sum(range(2, 100, 3))),
+                                       ('s9', 10, 45)]
+    # Finished imports leave no checkpoint behind
+    assert not os.path.exists(csv_path + '.checkpoint')
+
+
+def test_bad_rows_skipped(tmp_path, db_args, capsys):
+    path = str(tmp_path / 'a.csv')
+    write_csv(path, 10, extra=['s0,2024-01-02 00:00:00,abc,1',
+                               's0,2024-01-02 00:00:00,1,2,3',
+                               's0,not a time,1,2',
+                               's0,2024-01-02 00:00:00,nan,1',
+                               's0,2040-01-01 00:00:00,1,2'])
+
+    importer = Importer(db_args)
+    assert importer.import_file(path) == (10, 5)
+    importer.close()
+
+    out = capsys.readouterr().out
+    for line in (12, 13, 14, 15, 16):
+        assert f"{path}:{line}: skipped" in out
+
+
+def test_bad_rows_strict(tmp_path, db_args):
+    path = str(tmp_path / 'a.csv')
+    write_csv(path, 10, extra=['s0,2024-01-02 00:00:00,abc,1'])
+
+    importer = Importer(db_args, strict=True)
+    with pytest.raises(ValueError, match=f"{path}:12:"):
+        importer.import_file(path)
+    importer.close()
+
+
+def test_resume_with_other_chunk_size(tmp_path, db_args):
+    path = str(tmp_path / 'a.csv')
+    write_csv(path, 100)
+
+    # Interrupt the second chunk after s0 is committed but before s1
+    importer = Importer(db_args, chunk_size=30)
+    load_group = importer.load_group
+
+    def interrupted(name, readings, checkpoint):
+        if checkpoint.rows == 30 and name == 's1':
+            raise Interrupted()
+        return load_group(name, readings, checkpoint)
+
+    importer.load_group = interrupted
+    with pytest.raises(Interrupted):
+        importer.import_file(path)
+    importer.close()
+    assert os.path.exists(path + '.checkpoint')
+
+    importer = Importer(db_args, chunk_size=7)
+    importer.import_file(path)
+    importer.close()
+
+    # Every row is loaded exactly once
+    assert counts(db_args['path']) == [('s0', 34, sum(range(0, 100, 3))),
+                                       ('s1', 33, sum(range(1, 100, 3))),
+                                       ('s2', 33, sum(range(2, 100, 3)))]
+
+
+def test_checkpoint_for_other_database(tmp_path, db_args):
+    path = str(tmp_path / 'a.csv')
+    write_csv(path, 10)
+    with open(path + '.checkpoint', 'w') as f:
+        json.dump({'target': 'sqlite:///elsewhere.db', 'chunk_size': 5, 'rows': 5, 'sensors': []}, f)
+
+    importer = Importer(db_args)
+    with pytest.raises(ValueError, match="elsewhere"):
+        importer.import_file(path)
+    importer.close()
+
+
+def test_connections_shared_across_files(tmp_path, db_args):
+    paths = []
+    for i in range(5):
+        paths.append(str(tmp_path / f'{i}.csv'))
+        write_csv(paths[-1], 20)
+
+    # SQLite has a single writer, so the workers are reduced to one connection for all files
+    importer = Importer(db_args, workers=4)
+    for path in paths:
+        importer.import_file(path)
+    assert importer.workers == 1 and len(importer.connections) == 1
+    importer.close()
+
+
+def test_locked_database_exits_cleanly(tmp_path, db_args, monkeypatch, capsys):
+    path = str(tmp_path / 'a.csv')
+    write_csv(path, 10)
+
+    def locked(self, name, readings, checkpoint):
+        raise self.db.backend.OperationalError('database is locked')
+
+    monkeypatch.setattr(Importer, 'load_group', locked)
+    monkeypatch.setattr('sys.argv', ['bulk_import', path, '--backend', 'sqlite', '--path', db_args['path']])
+    with pytest.raises(SystemExit) as e:
+        bulk_import.main()
+    assert e.value.code == 1
+    assert "run the same command again to resume" in capsys.readouterr().err
@@ -0,0 +1,172 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from db.backends import can_inline
+from db.dbmanager import DBManager
+
+
+def test_insert_reading_and_query_db(db):
+    db.insert_reading('node1', '2024-01-01 00:00:01', {'depth': 1.5, 'temperature': 20})
+
+    assert db.get_sensor_list() == ['node1']
+    assert sorted(db.query_db('node1')) == ['1.5', '20.0']
+    assert db.query_db('node1', category='depth') == ['1.5']
+
+
+def test_insert_readings_links_values(db):
+    db.insert_readings('node1', [('2024-01-01 00:00:01', {'depth': 1.0, 'temperature': 10}),
+                                 ('2024-01-01 00:00:02', {'depth': 2.0}),
+                                 ('2024-01-01 00:00:03', {'depth': 3.0, 'temperature': 30})],
+                       netdata={'ip': '10.0.0.2', 'mac': '00:00:00:00:00:01'})
+
+    rows = db.get_observations('2024-01-01 00:00:00', '2024-01-01 00:00:10')
+    assert sorted(rows) == [(datetime(2024, 1, 1, 0, 0, 1), 1.0, 'depth', 'node1'),
+                            (datetime(2024, 1, 1, 0, 0, 1), 10.0, 'temperature', 'node1'),
+                            (datetime(2024, 1, 1, 0, 0, 2), 2.0, 'depth', 'node1'),
+                            (datetime(2024, 1, 1, 0, 0, 3), 3.0, 'depth', 'node1'),
+                            (datetime(2024, 1, 1, 0, 0, 3), 30.0, 'temperature', 'node1')]
+
+
+def test_insert_readings_many_statements(db):
+    # More readings than fit in one statement on either backend
+    n = db.backend.max_params * 2
+    db.insert_readings('node1', [(f'2024-01-01 {i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}', {'depth': i, 'temperature': -i})
+                                 for i in range(n)])
+
+    arrays = db.query_arrays('node1', category='temperature')
+    order = np.argsort(arrays['timestamp'])
+    assert np.array_equal(arrays['data'][order], -np.arange(n, dtype=float))
+
+
+def test_query_db_time_range(db):
+    db.insert_reading('node1', '2024-01-01 00:00:00', {'depth': 1})
+    db.insert_reading('node1', '2024-01-02 00:00:00', {'depth': 2})
+    db.insert_reading('node1', '2024-01-03 00:00:00', {'depth': 3})
+
+    assert db.query_db('node1', '2024-01-01 12:00:00', '2024-01-02 12:00:00') == ['2.0']
+
+
+def test_test_query(db):
+    db.insert_reading('node1', '2024-01-01 00:00:00', {'depth': 1})
+    db.insert_reading('node2', '2024-01-01 00:00:01', {'depth': 2, 'temperature': 5})
+
+    assert sorted(db.test_query('depth')) == [('node1', datetime(2024, 1, 1, 0, 0, 0), 1.0),
+                                              ('node2', datetime(2024, 1, 1, 0, 0, 1), 2.0)]
+
+
+def test_init_sensor_existing_name(db):
+    sid = db.init_sensor('node1')
+
+    assert db.init_sensor('node1') == sid
+    assert db.get_sensor_id('node1') == sid
+    assert db.get_sensor_id('missing') is None
+
+
+def test_calibration(db):
+    sid = db.init_sensor('node1')
+    db.set_calibration(sid, '2024-02-01 00:00:00', {'offset': 1})
+
+    assert db.get_calibration('node1') == [datetime(2024, 2, 1), {'offset': 1}]
+    assert db.get_calibration('missing') is None
+
+
+def test_calibration_unknown_sensor(db):
+    with pytest.raises(ValueError):
+        db.set_calibration(999, '2024-02-01 00:00:00', {'offset': 1})
+
+
+def test_heartbeats(db):
+    assert db.read_heartbeat('node1') is None
+
+    db.update_heartbeat('node1', '2024-01-01 00:05:00')
+    db.update_heartbeat('node1', '2024-01-01 00:10:00')
+
+    assert db.read_heartbeat('node1') == datetime(2024, 1, 1, 0, 10, 0)
+
+
+def test_query_arrays(db):
+    db.insert_reading('node1', '2024-01-01 00:00:01', {'depth': 1.5, 'temperature': 20})
+    db.insert_reading('node2', '2024-01-01 00:00:02', {'depth': 2.5})
+    db.insert_reading('node2', '2024-01-01 00:00:03', {'depth': None})
+
+    arrays = db.query_arrays(category='depth')
+    order = np.argsort(arrays['timestamp'])
+    assert arrays['timestamp'].dtype == np.dtype('datetime64[s]')
+    assert arrays['data'].dtype == np.float64
+    assert arrays['sensor'].dtype == np.int32
+    assert list(arrays['timestamp'][order]) == [np.datetime64('2024-01-01T00:00:01'), np.datetime64('2024-01-01T00:00:02')]
+    assert list(arrays['data'][order]) == [1.5, 2.5]
+    assert list(arrays['sensor_names'][arrays['sensor'][order]]) == ['node1', 'node2']
+
+    arrays = db.query_arrays('node1', '2024-01-01 00:00:00', '2024-01-01 00:00:05')
+    assert sorted(arrays['data']) == [1.5, 20.0]
+
+    arrays = db.query_arrays('missing')
+    assert len(arrays['data']) == 0 and arrays['timestamp'].dtype == np.dtype('datetime64[s]')
+
+
+def test_query_arrays_quoted_values(db):
+    name = "it's\\"
+    db.insert_reading(name, '2024-01-01 00:00:01', {'depth': 1.5, "o'clock": 7})
+    db.insert_reading('node2', '2024-01-01 00:00:02', {'depth': 2.5})
+
+    # Values that cannot be inlined are bound, never pasted into the query
+    assert list(db.query_arrays(name)['data']) in ([1.5, 7.0], [7.0, 1.5])
+    assert list(db.query_arrays(category="o'clock")['data']) == [7.0]
+    assert len(db.query_arrays("x' OR '1'='1")['data']) == 0
+    # Query bounds outside the TIMESTAMP range are clamped rather than rejected
+    assert len(db.query_arrays('node2', '1900-01-01', '2100-01-01')['data']) == 1
+    with pytest.raises(ValueError):
+        db.query_arrays('node2', 'garbage', '2024-01-02 00:00:00')
+
+
+def test_can_inline():
+    assert can_inline(3) and can_inline('2024-01-01 00:00:01') and can_inline('field_1.avg')
+    assert not can_inline("o'clock") and not can_inline('a\\') and not can_inline(True) and not can_inline(None)
+
+
+def test_query_arrow(db):
+    pytest.importorskip('pyarrow')
+    db.insert_reading('node1', '2024-01-01 00:00:01', {'depth': 1.5})
+
+    table = db.query_arrow()
+    assert table.column('data').to_pylist() == [1.5]
+    assert table.column('sensor').to_pylist() == ['node1']
+
+
+@pytest.mark.parametrize('timestamp', ['garbage', '2024-13-01 00:00:00', '', '1960-01-01', '2040-01-01 00:00:00',
+                                       '1970-01-01T00:00:00Z'])
+def test_invalid_timestamp(db, timestamp):
+    with pytest.raises(ValueError):
+        db.insert_reading('node1', timestamp, {'depth': 1})
+    with pytest.raises(ValueError):
+        db.update_heartbeat('node1', timestamp)
+
+    # Nothing was written by the rejected reading
+    assert db.get_observations('2000-01-01', '2100-01-01') == []
+
+
+def test_timestamp_forms(db):
+    db.insert_reading('node1', '2024-01-01T00:00:01', {'depth': 1})
+    db.insert_reading('node1', datetime(2024, 1, 1, 0, 0, 2), {'depth': 2})
+    db.insert_reading('node1', '2024-01-01T00:00:03+00:00', {'depth': 3})
+    db.insert_reading('node1', '2024-01-01T00:00:04Z', {'depth': 4})
+
+    stamps = [row[0] for row in db.get_observations('2000-01-01', '2100-01-01')]
+    assert len(stamps) == 4 and all(stamp.tzinfo is None for stamp in stamps)
+    assert datetime(2024, 1, 1, 0, 0, 1) in stamps and datetime(2024, 1, 1, 0, 0, 2) in stamps
+
+
+def test_sqlite_first_use_keeps_data(tmp_path):
+    path = str(tmp_path / 'test.db')
+    first = DBManager(backend='sqlite', path=path)
+    first.insert_reading('node1', '2024-01-01 00:00:01', {'depth': 1})
+
+    # Opening more connections, or creating the schema again, never drops data
+    second = DBManager(backend='sqlite', path=path)
+    second.create_tables()
+    assert second.query_db('node1') == ['1.0']
+    first.close()
+    second.close()
@@ -0,0 +1,67 @@
+import time
+
+from db.monitor import IngestMonitor
+from sensors import load
+from sensors.load import get_directives, BASE_RETRY_S, MAX_BATCH
+from sensors.models.notifications import PRIORITY
+
+
+def test_directives_idle():
+    directives, shed = get_directives(PRIORITY.default, load=0.0)
+
+    assert directives == {'batch': 1, 'delay': 0, 'retry': BASE_RETRY_S}
+    assert not shed
+
+
+def test_directives_back_off_with_load():
+    light, _ = get_directives(PRIORITY.default, load=0.75)
+    heavy, _ = get_directives(PRIORITY.default, load=100.0)
+
+    assert 1 < light['batch'] < heavy['batch'] == MAX_BATCH
+    assert 0 < light['delay'] < heavy['delay']
+    assert BASE_RETRY_S < light['retry'] < heavy['retry']
+
+
+def test_high_priority_shed_last():
+    _, default_shed = get_directives(PRIORITY.default, load=1.5, inflight_load=1.5)
+    _, high_shed = get_directives(PRIORITY.high, load=1.5, inflight_load=1.5)
+
+    assert default_shed and not high_shed
+
+
+def test_slow_write_does_not_shed_high_priority(monkeypatch):
+    # One 10 s write puts the smoothed latency far past the target
+    monitor = IngestMonitor()
+    clock = iter([0.0, 10.0])
+    monkeypatch.setattr(time, 'perf_counter', lambda: next(clock))
+    with monitor.track():
+        pass
+    monkeypatch.setattr(load, 'monitor', monitor)
+    assert monitor.load() > 2
+
+    default, default_shed = get_directives(PRIORITY.default)
+    for priority in (PRIORITY.high, PRIORITY.urgent):
+        directives, shed = get_directives(priority)
+        # Slowed down, but still accepted
+        assert not shed
+        assert 1 < directives['batch'] <= default['batch'] and directives['retry'] > BASE_RETRY_S
+    assert default_shed
+
+    # Writes piling up do refuse them
+    _, shed = get_directives(PRIORITY.high, load=2.5, inflight_load=2.5)
+    assert shed
+
+
+def test_monitor_tracks_and_decays(monkeypatch):
+    monitor = IngestMonitor(alpha=1.0)
+    with monitor.track():
+        assert monitor.inflight == 1
+        time.sleep(0.05)
+    assert monitor.inflight == 0
+    busy = monitor.load()
+    assert busy > 0
+
+    # Once writes stop, the load falls away
+    now = time.monotonic()
+    monkeypatch.setattr(time, 'monotonic', lambda: now + 600)
+    assert monitor.load() < busy / 1000
@@ -0,0 +1,123 @@
+import sys
+import types
+
+import pytest
+from flask import Flask
+
+from db import backends
+from db.dbmanager import DBManager
+from db.monitor import IngestMonitor
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # config.py is written per deployment, provide the values the sensors need
+    config = types.ModuleType('config')
+    config.HEARTBEAT_INTERVAL_MINS = 10
+    monkeypatch.setitem(sys.modules, 'config', config)
+    monkeypatch.setattr(backends, 'DB_BACKEND', 'sqlite')
+    monkeypatch.setattr(backends, 'SQLITE_PATH', str(tmp_path / 'test.db'))
+
+    from sensors import load, routes
+    from sensors.models import heartbeat, temperature
+
+    # Record notifications instead of sending them
+    sent = []
+    for module in (heartbeat, temperature):
+        monkeypatch.setattr(module, 'notify', lambda source, message, priority=None: sent.append((source, message)))
+    monitor = IngestMonitor()
+    monkeypatch.setattr(load, 'monitor', monitor)
+
+    app = Flask(__name__)
+    app.register_blueprint(routes.bp, url_prefix='/sensors')
+    app.sent = sent
+    app.monitor = monitor
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def observations():
+    db = DBManager()
+    rows = db.get_observations('2000-01-01', '2037-01-01')
+    db.close()
+    return sorted(rows)
+
+
+def post(client, sensortype, readings, name='node1'):
+    return client.post('/sensors/', json={'name': name, 'type': sensortype, 'readings': readings})
+
+
+def test_single_reading(client):
+    reply = client.post('/sensors/', json={'name': 'node1', 'type': 'default',
+                                           'reading': {'timestamp': '2024-01-01 00:00:01', 'data': {'depth': 1}}})
+
+    assert reply.status_code == 200
+    assert reply.json['time'] == '2024-01-01 00:00:01'
+    assert set(reply.json['directives']) == {'batch', 'delay', 'retry'}
+    assert len(observations()) == 1
+
+
+def test_readings_batch(client):
+    reply = post(client, 'default', [{'timestamp': '2024-01-01 00:00:01', 'data': {'depth': 1}},
+                                     {'timestamp': '2024-01-01 00:00:02', 'data': {'depth': 2}}])
+
+    assert reply.status_code == 200
+    assert reply.json['time'] == '2024-01-01 00:00:02'
+    assert [row[1] for row in observations()] == [1.0, 2.0]
+
+
+def test_water_readings_batch(client):
+    # Each reading carries the depths sampled at millis after its timestamp
+    reply = post(client, 'water', [{'timestamp': '2024-01-01 00:00:00', 'data': {'depth': [1, 2], 'millis': [0, 1000]}},
+                                   {'timestamp': '2024-01-01 00:01:00', 'data': {'depth': [3], 'millis': [2000]}}])
+
+    assert reply.status_code == 200
+    assert [(str(row[0]), row[1]) for row in observations()] == [('2024-01-01 00:00:00', 1.0),
+                                                                   ('2024-01-01 00:00:01', 2.0),
+                                                                   ('2024-01-01 00:01:02', 3.0)]
+
+
+def test_temperature_notifies_each_reading(app, client):
+    reply = post(client, 'temphum', [{'timestamp': '2024-01-01 18:00:05', 'data': {'temperature': 20, 'humidity': 50}},
+                                     {'timestamp': '2024-01-01 18:05:05', 'data': {'temperature': 21, 'humidity': 51}},
+                                     {'timestamp': '2024-01-02 18:00:05', 'data': {'temperature': 22, 'humidity': 52}}])
+
+    assert reply.status_code == 200
+    assert len(observations()) == 6
+    assert [message.split(' from')[0] for _, message in app.sent] == ['At 2024-01-01 18:00:05', 'At 2024-01-02 18:00:05']
+
+
+@pytest.mark.parametrize('body', [{'readings': []},
+                                  {'readings': {'timestamp': '2024-01-01 00:00:01', 'data': {}}},
+                                  {'readings': [{'data': {'depth': 1}}]},
+                                  {},
+                                  {'reading': {'timestamp': 'garbage', 'data': {'depth': 1}}}])
+def test_bad_readings_rejected(client, body):
+    reply = client.post('/sensors/', json={'name': 'node1', 'type': 'default', **body})
+
+    assert reply.status_code == 400
+    assert observations() == []
+
+
+def test_shed_when_overloaded(app, client):
+    app.monitor.inflight = 100
+
+    reply = post(client, 'default', [{'timestamp': '2024-01-01 00:00:01', 'data': {'depth': 1}}])
+
+    assert reply.status_code == 503
+    assert int(reply.headers['Retry-After']) == reply.json['directives']['retry']
+    assert observations() == []
+
+
+def test_slow_writes_keep_water_alarms(app, client):
+    app.monitor.latency = 10.0
+
+    default = post(client, 'default', [{'timestamp': '2024-01-01 00:00:01', 'data': {'depth': 1}}], name='node1')
+    water = post(client, 'water', [{'timestamp': '2024-01-01 00:00:00', 'data': {'depth': [5], 'millis': [0]}}], name='node2')
+
+    assert default.status_code == 503
+    assert water.status_code == 200 and water.json['directives']['batch'] > 1